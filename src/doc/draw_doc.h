@@ -15,6 +15,8 @@
 
 #define DOC_PYGAMEDRAWLINES "lines(Surface, color, closed, pointlist, width=1) -> Rect\ndraw multiple contiguous line segments"
 
+#define DOC_PYGAMEDRAWLINESBATCH "lines_batch(Surface, color, segments, width=1) -> Rect\ndraw many separate line segments"
+
 #define DOC_PYGAMEDRAWAALINE "aaline(Surface, color, startpos, endpos, blend=1) -> Rect\ndraw fine antialiased lines"
 
 #define DOC_PYGAMEDRAWAALINES "aalines(Surface, color, closed, pointlist, blend=1) -> Rect\ndraw a connected sequence of antialiased lines"
@@ -56,6 +58,10 @@ pygame.draw.lines
  lines(Surface, color, closed, pointlist, width=1) -> Rect
 draw multiple contiguous line segments
 
+pygame.draw.lines_batch
+ lines_batch(Surface, color, segments, width=1) -> Rect
+draw many separate line segments
+
 pygame.draw.aaline
  aaline(Surface, color, startpos, endpos, blend=1) -> Rect
 draw fine antialiased lines
@@ -28,6 +28,17 @@
 #include "doc/draw_doc.h"
 #include <math.h>
 
+#if defined(__GNUC__) && !defined(__clang__) && \
+    (defined(__x86_64__) || defined(__i386__)) && \
+    ((__GNUC__ > 4) || (__GNUC__ == 4 && __GNUC_MINOR__ >= 9))
+#define DRAW_AVX2_SUPPORT
+#include <immintrin.h>
+#endif
+#if defined(__SSE2__) || defined(_M_X64)
+#define DRAW_SSE2_SUPPORT
+#include <emmintrin.h>
+#endif
+
 /* Many C libraries seem to lack the trunc call (added in C99) */
 #define trunc(d)   (((d) >= 0.0) ? (floor(d)) : (ceil(d)))
 #define FRAC(z)    ((z) - trunc(z))
@@ -47,11 +58,65 @@ static void drawaaline(SDL_Surface* surf, Uint32 color, float startx, float star
                        int blend);
 static void drawhorzline(SDL_Surface* surf, Uint32 color, int startx, int starty, int endx);
 static void drawvertline(SDL_Surface* surf, Uint32 color, int x1, int y1, int y2);
+static void draw_rect_outline(SDL_Surface* surf, Uint32 color, int l, int t, int r, int b, int width);
+static void fill_span32_c(Uint32* pixel, int count, Uint32 color);
+static void fill_span32_init(void);
+static void (*fill_span32)(Uint32* pixel, int count, Uint32 color) = fill_span32_c;
 static void draw_arc(SDL_Surface *dst, int x, int y, int radius1, int radius2, double angle_start, double angle_stop, Uint32 color);
 static void draw_ellipse(SDL_Surface *dst, int x, int y, int rx, int ry, Uint32 color);
 static void draw_fillellipse(SDL_Surface *dst, int x, int y, int rx, int ry, Uint32 color);
-static void draw_fillpoly(SDL_Surface *dst, int *vx, int *vy, int n, Uint32 color);
+static int draw_fillpoly(SDL_Surface *dst, int *vx, int *vy, int n, Uint32 color);
+
 
+/*the last tuple of ints given as a color, and its decoded value. tuples
+  of ints can not change, so while the same object keeps being passed in
+  (the usual case for a constant color) the sequence parsing is skipped*/
+static PyObject *last_colorobj = NULL;
+static Uint8 last_rgba[4];
+
+static int rgba_from_colorobj(PyObject* colorobj, Uint8* rgba)
+{
+    Py_ssize_t loop, length;
+    PyObject* item;
+
+    if(colorobj == last_colorobj)
+    {
+        memcpy(rgba, last_rgba, 4);
+        return 1;
+    }
+    if(!RGBAFromColorObj(colorobj, rgba))
+        return 0;
+
+    if(!PyTuple_CheckExact(colorobj))
+        return 1;
+    length = PyTuple_GET_SIZE(colorobj);
+    if(length < 3)
+        return 1;
+    for(loop = 0; loop < length; ++loop)
+    {
+        item = PyTuple_GET_ITEM(colorobj, loop);
+        if(!PyInt_Check(item) && !PyLong_Check(item))
+            return 1;
+    }
+    Py_INCREF(colorobj);
+    Py_XDECREF(last_colorobj);
+    last_colorobj = colorobj;
+    memcpy(last_rgba, rgba, 4);
+    return 1;
+}
+
+static int color_from_obj(PyObject* colorobj, SDL_Surface* surf, Uint32* color)
+{
+    Uint8 rgba[4];
+
+    if(PyInt_Check(colorobj))
+        *color = (Uint32)PyInt_AsLong(colorobj);
+    else if(rgba_from_colorobj(colorobj, rgba))
+        *color = SDL_MapRGBA(surf->format, rgba[0], rgba[1], rgba[2], rgba[3]);
+    else
+        return 0;
+    return 1;
+}
 
 
 static PyObject* aaline(PyObject* self, PyObject* arg)
@@ -74,7 +139,7 @@ static PyObject* aaline(PyObject* self, PyObject* arg)
     if(surf->format->BytesPerPixel !=3 && surf->format->BytesPerPixel != 4)
         return RAISE(PyExc_ValueError, "unsupported bit depth for aaline draw (supports 32 & 24 bit)");
 
-    if(RGBAFromColorObj(colorobj, rgba))
+    if(rgba_from_colorobj(colorobj, rgba))
         color = SDL_MapRGBA(surf->format, rgba[0], rgba[1], rgba[2], rgba[3]);
     else
         return RAISE(PyExc_TypeError, "invalid color argument");
@@ -128,7 +193,6 @@ static PyObject* line(PyObject* self, PyObject* arg)
     int rtop, rleft, rwidth, rheight;
     int width = 1;
     int pts[4];
-    Uint8 rgba[4];
     Uint32 color;
     int anydraw;
 
@@ -140,11 +204,7 @@ static PyObject* line(PyObject* self, PyObject* arg)
     if(surf->format->BytesPerPixel <= 0 || surf->format->BytesPerPixel > 4)
         return RAISE(PyExc_ValueError, "unsupport bit depth for line draw");
 
-    if(PyInt_Check(colorobj))
-        color = (Uint32)PyInt_AsLong(colorobj);
-    else if(RGBAFromColorObj(colorobj, rgba))
-        color = SDL_MapRGBA(surf->format, rgba[0], rgba[1], rgba[2], rgba[3]);
-    else
+    if(!color_from_obj(colorobj, surf, &color))
         return RAISE(PyExc_TypeError, "invalid color argument");
 
     if(!TwoIntsFromObj(start, &startx, &starty))
@@ -208,7 +268,7 @@ static PyObject* aalines(PyObject* self, PyObject* arg)
     if(surf->format->BytesPerPixel !=3 && surf->format->BytesPerPixel != 4)
         return RAISE(PyExc_ValueError, "unsupported bit depth for aaline draw (supports 32 & 24 bit)");
 
-    if(RGBAFromColorObj(colorobj, rgba))
+    if(rgba_from_colorobj(colorobj, rgba))
         color = SDL_MapRGBA(surf->format, rgba[0], rgba[1], rgba[2], rgba[3]);
     else
         return RAISE(PyExc_TypeError, "invalid color argument");
@@ -282,7 +342,6 @@ static PyObject* lines(PyObject* self, PyObject* arg)
     int x, y;
     int top, left, bottom, right;
     int pts[4], width=1;
-    Uint8 rgba[4];
     Uint32 color;
     int closed;
     int result, loop, length, drawn;
@@ -296,11 +355,7 @@ static PyObject* lines(PyObject* self, PyObject* arg)
     if(surf->format->BytesPerPixel <= 0 || surf->format->BytesPerPixel > 4)
         return RAISE(PyExc_ValueError, "unsupport bit depth for line draw");
 
-    if(PyInt_Check(colorobj))
-        color = (Uint32)PyInt_AsLong(colorobj);
-    else if(RGBAFromColorObj(colorobj, rgba))
-        color = SDL_MapRGBA(surf->format, rgba[0], rgba[1], rgba[2], rgba[3]);
-    else
+    if(!color_from_obj(colorobj, surf, &color))
         return RAISE(PyExc_TypeError, "invalid color argument");
 
     closed = PyObject_IsTrue(closedobj);
@@ -367,12 +422,160 @@ static PyObject* lines(PyObject* self, PyObject* arg)
 }
 
 
+/*read a (start_pos, end_pos) pair into pts*/
+static int segment_from_obj(PyObject* obj, int* pts)
+{
+    PyObject *start, *end;
+    int result;
+
+    if(!PySequence_Check(obj) || PySequence_Length(obj) != 2)
+        return 0;
+    start = PySequence_GetItem(obj, 0);
+    end = PySequence_GetItem(obj, 1);
+    result = start && end &&
+        TwoIntsFromObj(start, &pts[0], &pts[1]) &&
+        TwoIntsFromObj(end, &pts[2], &pts[3]);
+    Py_XDECREF(start);
+    Py_XDECREF(end);
+    return result;
+}
+
+
+/*the box around everything clip_and_draw_line_width draws for a wide line
+  that is neither horizontal nor vertical: the union of the clipped, offset
+  copies of the line that make up its width. returns 0 when none is seen*/
+static int wide_line_bounds(SDL_Rect* rect, int width, const int* line, int* bounds)
+{
+    int xinc = 0, yinc = 0, offset, found = 0;
+    int newpts[4];
+
+    if(abs(line[0]-line[2]) > abs(line[1]-line[3]))
+        yinc = 1;
+    else
+        xinc = 1;
+
+    for(offset = -((width-1)/2); offset <= width/2; ++offset)
+    {
+        newpts[0] = line[0] + xinc*offset;
+        newpts[1] = line[1] + yinc*offset;
+        newpts[2] = line[2] + xinc*offset;
+        newpts[3] = line[3] + yinc*offset;
+        if(!clipline(newpts, rect->x, rect->y, rect->x+rect->w-1, rect->y+rect->h-1))
+            continue;
+        if(!found)
+        {
+            bounds[0] = bounds[2] = newpts[0];
+            bounds[1] = bounds[3] = newpts[1];
+            found = 1;
+        }
+        bounds[0] = MIN(MIN(newpts[0], newpts[2]), bounds[0]);
+        bounds[1] = MIN(MIN(newpts[1], newpts[3]), bounds[1]);
+        bounds[2] = MAX(MAX(newpts[0], newpts[2]), bounds[2]);
+        bounds[3] = MAX(MAX(newpts[1], newpts[3]), bounds[3]);
+    }
+    return found;
+}
+
+
+static PyObject* lines_batch(PyObject* self, PyObject* arg)
+{
+    PyObject *surfobj, *colorobj, *segments, *item;
+    SDL_Surface* surf;
+    Uint32 color;
+    int width = 1;
+    int *seglist, pts[4];
+    int length, loop, result, anydrawn = 0;
+    int top = 0, left = 0, bottom = 0, right = 0;
+
+    /*get all the arguments*/
+    if(!PyArg_ParseTuple(arg, "O!OO|i", &PySurface_Type, &surfobj, &colorobj, &segments, &width))
+        return NULL;
+    surf = PySurface_AsSurface(surfobj);
+
+    if(surf->format->BytesPerPixel <= 0 || surf->format->BytesPerPixel > 4)
+        return RAISE(PyExc_ValueError, "unsupport bit depth for line draw");
+
+    if(!color_from_obj(colorobj, surf, &color))
+        return RAISE(PyExc_TypeError, "invalid color argument");
+
+    if(!PySequence_Check(segments))
+        return RAISE(PyExc_TypeError, "segments argument must be a sequence of point pairs");
+    length = PySequence_Length(segments);
+    if(length < 0)
+        return NULL;
+
+    /*read every segment before drawing, so a bad one draws nothing*/
+    seglist = PyMem_New(int, MAX(length, 1) * 4);
+    if(!seglist)
+        return PyErr_NoMemory();
+    for(loop = 0; loop < length; ++loop)
+    {
+        item = PySequence_GetItem(segments, loop);
+        result = item && segment_from_obj(item, seglist + loop * 4);
+        Py_XDECREF(item);
+        if(!result)
+        {
+            PyMem_Del(seglist);
+            return RAISE(PyExc_TypeError, "segments must be pairs of number pairs");
+        }
+    }
+
+    if(length)
+    {
+        left = right = seglist[0];
+        top = bottom = seglist[1];
+    }
+    if(width < 1 || !length)
+    {
+        PyMem_Del(seglist);
+        return PyRect_New4(left, top, 0, 0);
+    }
+
+    /*one lock and one color mapping for the whole batch*/
+    if(!PySurface_Lock(surfobj))
+    {
+        PyMem_Del(seglist);
+        return NULL;
+    }
+
+    for(loop = 0; loop < length; ++loop)
+    {
+        int* segment = seglist + loop * 4;
+        memcpy(pts, segment, sizeof(pts));
+        if(!clip_and_draw_line_width(surf, &surf->clip_rect, color, width, pts))
+            continue;
+        /*pts only hold the drawn box for thin, horizontal and vertical
+          lines; wide diagonal ones have their offset copies measured*/
+        if(width > 1 && segment[0] != segment[2] && segment[1] != segment[3] &&
+           !wide_line_bounds(&surf->clip_rect, width, segment, pts))
+            continue;
+        if(!anydrawn)
+        {
+            left = right = pts[0];
+            top = bottom = pts[1];
+            anydrawn = 1;
+        }
+        left = MIN(MIN(pts[0], pts[2]), left);
+        top = MIN(MIN(pts[1], pts[3]), top);
+        right = MAX(MAX(pts[0], pts[2]), right);
+        bottom = MAX(MAX(pts[1], pts[3]), bottom);
+    }
+    PyMem_Del(seglist);
+
+    if(!PySurface_Unlock(surfobj)) return NULL;
+
+    /*compute return rect*/
+    if(!anydrawn)
+        return PyRect_New4(left, top, 0, 0);
+    return PyRect_New4(left, top, right-left+1, bottom-top+1);
+}
+
+
 static PyObject* arc(PyObject* self, PyObject* arg)
 {
     PyObject *surfobj, *colorobj, *rectobj;
     GAME_Rect *rect, temp;
     SDL_Surface* surf;
-    Uint8 rgba[4];
     Uint32 color;
     int width=1, loop, t, l, b, r;
     double angle_start, angle_stop;
@@ -389,11 +592,7 @@ static PyObject* arc(PyObject* self, PyObject* arg)
     if(surf->format->BytesPerPixel <= 0 || surf->format->BytesPerPixel > 4)
         return RAISE(PyExc_ValueError, "unsupport bit depth for drawing");
 
-    if(PyInt_Check(colorobj))
-        color = (Uint32)PyInt_AsLong(colorobj);
-    else if(RGBAFromColorObj(colorobj, rgba))
-        color = SDL_MapRGBA(surf->format, rgba[0], rgba[1], rgba[2], rgba[3]);
-    else
+    if(!color_from_obj(colorobj, surf, &color))
         return RAISE(PyExc_TypeError, "invalid color argument");
 
     if ( width < 0 )
@@ -429,7 +628,6 @@ static PyObject* ellipse(PyObject* self, PyObject* arg)
     PyObject *surfobj, *colorobj, *rectobj;
     GAME_Rect *rect, temp;
     SDL_Surface* surf;
-    Uint8 rgba[4];
     Uint32 color;
     int width=0, loop, t, l, b, r;
 
@@ -444,11 +642,7 @@ static PyObject* ellipse(PyObject* self, PyObject* arg)
     if(surf->format->BytesPerPixel <= 0 || surf->format->BytesPerPixel > 4)
         return RAISE(PyExc_ValueError, "unsupport bit depth for drawing");
 
-    if(PyInt_Check(colorobj))
-        color = (Uint32)PyInt_AsLong(colorobj);
-    else if(RGBAFromColorObj(colorobj, rgba))
-        color = SDL_MapRGBA(surf->format, rgba[0], rgba[1], rgba[2], rgba[3]);
-    else
+    if(!color_from_obj(colorobj, surf, &color))
         return RAISE(PyExc_TypeError, "invalid color argument");
 
     if ( width < 0 )
@@ -485,7 +679,6 @@ static PyObject* circle(PyObject* self, PyObject* arg)
 {
     PyObject *surfobj, *colorobj;
     SDL_Surface* surf;
-    Uint8 rgba[4];
     Uint32 color;
     int posx, posy, radius, t, l, b, r;
     int width=0, loop;
@@ -498,11 +691,7 @@ static PyObject* circle(PyObject* self, PyObject* arg)
     if(surf->format->BytesPerPixel <= 0 || surf->format->BytesPerPixel > 4)
         return RAISE(PyExc_ValueError, "unsupport bit depth for drawing");
 
-    if(PyInt_Check(colorobj))
-        color = (Uint32)PyInt_AsLong(colorobj);
-    else if(RGBAFromColorObj(colorobj, rgba))
-        color = SDL_MapRGBA(surf->format, rgba[0], rgba[1], rgba[2], rgba[3]);
-    else
+    if(!color_from_obj(colorobj, surf, &color))
         return RAISE(PyExc_TypeError, "invalid color argument");
 
     if ( radius < 0 )
@@ -535,7 +724,6 @@ static PyObject* polygon(PyObject* self, PyObject* arg)
 {
     PyObject *surfobj, *colorobj, *points, *item;
     SDL_Surface* surf;
-    Uint8 rgba[4];
     Uint32 color;
     int width=0, length, loop, numpoints;
     int *xlist, *ylist;
@@ -562,11 +750,7 @@ static PyObject* polygon(PyObject* self, PyObject* arg)
     if(surf->format->BytesPerPixel <= 0 || surf->format->BytesPerPixel > 4)
         return RAISE(PyExc_ValueError, "unsupport bit depth for line draw");
 
-    if(PyInt_Check(colorobj))
-        color = (Uint32)PyInt_AsLong(colorobj);
-    else if(RGBAFromColorObj(colorobj, rgba))
-        color = SDL_MapRGBA(surf->format, rgba[0], rgba[1], rgba[2], rgba[3]);
-    else
+    if(!color_from_obj(colorobj, surf, &color))
         return RAISE(PyExc_TypeError, "invalid color argument");
 
     if(!PySequence_Check(points))
@@ -585,6 +769,11 @@ static PyObject* polygon(PyObject* self, PyObject* arg)
 
     xlist = PyMem_New(int, length);
     ylist = PyMem_New(int, length);
+    if(!xlist || !ylist)
+    {
+        PyMem_Del(xlist); PyMem_Del(ylist);
+        return PyErr_NoMemory();
+    }
 
     numpoints = 0;
     for(loop = 0; loop < length; ++loop)
@@ -608,11 +797,17 @@ static PyObject* polygon(PyObject* self, PyObject* arg)
         return NULL;
     }
 
-    draw_fillpoly(surf, xlist, ylist, numpoints, color);
+    /*the scanline fill only touches the locked pixels, let other threads
+      run meanwhile*/
+    Py_BEGIN_ALLOW_THREADS;
+    result = draw_fillpoly(surf, xlist, ylist, numpoints, color);
+    Py_END_ALLOW_THREADS;
 
     PyMem_Del(xlist); PyMem_Del(ylist);
     if(!PySurface_Unlock(surfobj))
         return NULL;
+    if(!result)
+        return PyErr_NoMemory();
 
     left = MAX(left, surf->clip_rect.x);
     top = MAX(top, surf->clip_rect.y);
@@ -638,6 +833,96 @@ static PyObject* rect(PyObject* self, PyObject* arg)
     l = rect->x; r = rect->x + rect->w - 1;
     t = rect->y; b = rect->y + rect->h - 1;
 
+    if(width > 0)
+    {
+        /*outline: draw the four edges directly, in the order lines() would
+          draw the closed point list, and return the same bounding rect*/
+        SDL_Surface* surf = PySurface_AsSurface(surfobj);
+        int edges[4][4] = {{l, t, r, t}, {r, t, r, b}, {r, b, l, b}, {l, b, l, t}};
+        int pts[4], loop;
+        int top = t, left = l, bottom = t, right = l;
+        Uint32 color;
+
+        if(surf->format->BytesPerPixel <= 0 || surf->format->BytesPerPixel > 4)
+            return RAISE(PyExc_ValueError, "unsupport bit depth for line draw");
+
+        if(!color_from_obj(colorobj, surf, &color))
+            return RAISE(PyExc_TypeError, "invalid color argument");
+
+        if(!PySurface_Lock(surfobj)) return NULL;
+
+        if(r > l && b > t)
+        {
+            /*every edge is a horizontal or vertical block here, so draw
+              the outline in one pass over its rows. the bounding rect is
+              made of the clipped blocks of the first three edges*/
+            SDL_Rect* clip = &surf->clip_rect;
+            int lo = (width-1)/2, hi = width/2;
+            int blocks[3][4] = {{l, t-lo, r, t+hi}, {r-lo, t, r+hi, b}, {l, b-lo, r, b+hi}};
+
+            draw_rect_outline(surf, color, l, t, r, b, width);
+            for(loop = 0; loop < 3; ++loop)
+            {
+                pts[0] = MAX(blocks[loop][0], clip->x);
+                pts[1] = MAX(blocks[loop][1], clip->y);
+                pts[2] = MIN(blocks[loop][2], clip->x+clip->w-1);
+                pts[3] = MIN(blocks[loop][3], clip->y+clip->h-1);
+                if(pts[0] > pts[2] || pts[1] > pts[3])
+                    continue;
+                left = MIN(pts[0], left);
+                top = MIN(pts[1], top);
+                right = MAX(pts[2], right);
+                bottom = MAX(pts[3], bottom);
+            }
+        }
+        else for(loop = 0; loop < 4; ++loop)
+        {
+            memcpy(pts, edges[loop], sizeof(pts));
+            /*the closing edge does not count towards the bounding rect*/
+            if(clip_and_draw_line_width(surf, &surf->clip_rect, color, width, pts) && loop < 3)
+            {
+                left = MIN(MIN(pts[0], pts[2]), left);
+                top = MIN(MIN(pts[1], pts[3]), top);
+                right = MAX(MAX(pts[0], pts[2]), right);
+                bottom = MAX(MAX(pts[1], pts[3]), bottom);
+            }
+        }
+
+        if(!PySurface_Unlock(surfobj)) return NULL;
+
+        return PyRect_New4(left, top, right-left+1, bottom-top+1);
+    }
+
+    if(width == 0 && rect->w > 0 && rect->h > 0)
+    {
+        /*solid fill: clip the rect and fill its rows directly, returning
+          the same rect polygon() reports for the four corners*/
+        SDL_Surface* surf = PySurface_AsSurface(surfobj);
+        SDL_Rect* clip = &surf->clip_rect;
+        int x1 = MAX(l, clip->x), x2 = MIN(r, clip->x + clip->w - 1);
+        int y1 = MAX(t, clip->y), y2 = MIN(b, clip->y + clip->h - 1);
+        int y;
+        Uint32 color;
+
+        if(surf->format->BytesPerPixel <= 0 || surf->format->BytesPerPixel > 4)
+            return RAISE(PyExc_ValueError, "unsupport bit depth for line draw");
+
+        if(!color_from_obj(colorobj, surf, &color))
+            return RAISE(PyExc_TypeError, "invalid color argument");
+
+        if(!PySurface_Lock(surfobj)) return NULL;
+
+        if(x1 <= x2)
+            for(y = y1; y <= y2; ++y)
+                drawhorzline(surf, color, x1, y, x2);
+
+        if(!PySurface_Unlock(surfobj)) return NULL;
+
+        r = MIN(r, clip->x + clip->w);
+        b = MIN(b, clip->y + clip->h);
+        return PyRect_New4(x1, y1, r-x1+1, b-y1+1);
+    }
+
     /*build the pointlist*/
     points = Py_BuildValue("((ii)(ii)(ii)(ii))", l, t, r, t, r, b, l, b);
 
@@ -682,11 +967,35 @@ static int clip_and_draw_line_width(SDL_Surface* surf, SDL_Rect* rect, Uint32 co
     int range[4];
     int anydrawn = 0;
 
+    /*thin lines go straight to the rasterizer, no range bookkeeping*/
+    if(width == 1)
+        return clip_and_draw_line(surf, rect, color, pts);
+
     if(abs(pts[0]-pts[2]) > abs(pts[1]-pts[3]))
         yinc = 1;
     else
         xinc = 1;
 
+    /*horizontal and vertical lines widen into a solid block, which is
+      filled row by row instead of as width separate lines*/
+    if(pts[0] == pts[2] || pts[1] == pts[3])
+    {
+        range[0] = MIN(pts[0], pts[2]) - xinc*((width-1)/2);
+        range[1] = MIN(pts[1], pts[3]) - yinc*((width-1)/2);
+        range[2] = MAX(pts[0], pts[2]) + xinc*(width/2);
+        range[3] = MAX(pts[1], pts[3]) + yinc*(width/2);
+        range[0] = MAX(range[0], rect->x);
+        range[1] = MAX(range[1], rect->y);
+        range[2] = MIN(range[2], rect->x+rect->w-1);
+        range[3] = MIN(range[3], rect->y+rect->h-1);
+        if(range[0] > range[2] || range[1] > range[3])
+            return 0;
+        for(loop = range[1]; loop <= range[3]; ++loop)
+            drawhorzline(surf, color, range[0], loop, range[2]);
+        memcpy(pts, range, sizeof(int)*4);
+        return 1;
+    }
+
     memcpy(newpts, pts, sizeof(int)*4);
     if(clip_and_draw_line(surf, rect, color, newpts))
     {
@@ -745,24 +1054,22 @@ http://www.ncsa.uiuc.edu/Vis/Graphics/src/clipCohSuth.c */
 #define REJECT(a,b) (a&b)
 #define ACCEPT(a,b) (!(a|b))
 
+/*the outcodes are built from the comparison results directly, which
+  compiles to flag sets and ors instead of four conditional jumps*/
 static int encode(int x, int y, int left, int top, int right, int bottom)
 {
-    int code = 0;
-    if(x < left)  code |= LEFT_EDGE;
-    if(x > right) code |= RIGHT_EDGE;
-    if(y < top)   code |= TOP_EDGE;
-    if(y > bottom)code |= BOTTOM_EDGE;
-    return code;
+    return ((x < left) * LEFT_EDGE) |
+           ((x > right) * RIGHT_EDGE) |
+           ((y < top) * TOP_EDGE) |
+           ((y > bottom) * BOTTOM_EDGE);
 }
 
 static int encodeFloat(float x, float y, int left, int top, int right, int bottom)
 {
-    int code = 0;
-    if(x < left)  code |= LEFT_EDGE;
-    if(x > right) code |= RIGHT_EDGE;
-    if(y < top)   code |= TOP_EDGE;
-    if(y > bottom)code |= BOTTOM_EDGE;
-    return code;
+    return ((x < left) * LEFT_EDGE) |
+           ((x > right) * RIGHT_EDGE) |
+           ((y < top) * TOP_EDGE) |
+           ((y > bottom) * BOTTOM_EDGE);
 }
 
 static int clipaaline(float* pts, int left, int top, int right, int bottom)
@@ -888,7 +1195,8 @@ static int set_at(SDL_Surface* surf, int x, int y, Uint32 color)
 {
     SDL_PixelFormat* format = surf->format;
     Uint8* pixels = (Uint8*)surf->pixels;
-    Uint8* byte_buf, rgb[4];
+    Uint8* byte_buf;
+    Uint8* colorptr;
 
     if(x < surf->clip_rect.x || x >= surf->clip_rect.x + surf->clip_rect.w ||
        y < surf->clip_rect.y || y >= surf->clip_rect.y + surf->clip_rect.h)
@@ -908,17 +1216,14 @@ static int set_at(SDL_Surface* surf, int x, int y, Uint32 color)
                 ~(*((Uint32*)(pixels + y * surf->pitch) + x)) * 31;
 */              break;
     default:/*case 3:*/
-        SDL_GetRGB(color, format, rgb, rgb+1, rgb+2);
+        /*store the mapped bytes like drawline does, instead of splitting
+          the color back into components for every pixel*/
+        if(SDL_BYTEORDER == SDL_BIG_ENDIAN) color <<= 8;
+        colorptr = (Uint8*)&color;
         byte_buf = (Uint8*)(pixels + y * surf->pitch) + x * 3;
-#if (SDL_BYTEORDER == SDL_LIL_ENDIAN)
-        *(byte_buf + (format->Rshift >> 3)) = rgb[0];
-        *(byte_buf + (format->Gshift >> 3)) = rgb[1];
-        *(byte_buf + (format->Bshift >> 3)) = rgb[2];
-#else
-        *(byte_buf + 2 - (format->Rshift >> 3)) = rgb[0];
-        *(byte_buf + 2 - (format->Gshift >> 3)) = rgb[1];
-        *(byte_buf + 2 - (format->Bshift >> 3)) = rgb[2];
-#endif
+        byte_buf[0] = colorptr[0];
+        byte_buf[1] = colorptr[1];
+        byte_buf[2] = colorptr[2];
         break;
     }
     return 1;
@@ -1120,6 +1425,7 @@ static void drawhorzline(SDL_Surface* surf, Uint32 color, int x1, int y1, int x2
 {
     Uint8 *pixel, *end;
     Uint8 *colorptr;
+    int count, done, step;
 
     if(x1 == x2)
     {
@@ -1138,28 +1444,108 @@ static void drawhorzline(SDL_Surface* surf, Uint32 color, int x1, int y1, int x2
         end = pixel + x1 * surf->format->BytesPerPixel;
         pixel += x2 * surf->format->BytesPerPixel;
     }
+    /*colors made of one repeated byte (black, white, greys in 8 bit) are a
+      plain memset at any depth*/
     switch(surf->format->BytesPerPixel)
     {
     case 1:
-        for(; pixel <= end; ++pixel) {
-            *pixel = (Uint8)color;
-        }break;
+        memset(pixel, (Uint8)color, end - pixel + 1);
+        break;
     case 2:
+        if((color & 0xff) == ((color >> 8) & 0xff))
+        {
+            memset(pixel, (Uint8)color, end - pixel + 2);
+            break;
+        }
         for(; pixel <= end; pixel+=2) {
             *(Uint16*)pixel = (Uint16)color;
         }break;
     case 3:
         if(SDL_BYTEORDER == SDL_BIG_ENDIAN) color <<= 8;
         colorptr = (Uint8*)&color;
-        for(; pixel <= end; pixel+=3) {
-            pixel[0] = colorptr[0];
-            pixel[1] = colorptr[1];
-            pixel[2] = colorptr[2];
+        pixel[0] = colorptr[0];
+        pixel[1] = colorptr[1];
+        pixel[2] = colorptr[2];
+        /*grow the span by copying what is already filled after itself*/
+        count = end - pixel + 3;
+        for(done = 3; done < count; done += step) {
+            step = MIN(done, count - done);
+            memcpy(pixel + done, pixel, step);
         }break;
     default: /*case 4*/
-        for(; pixel <= end; pixel+=4) {
-            *(Uint32*)pixel = color;
-          }break;
+        if(color == (color & 0xff) * 0x01010101U)
+            memset(pixel, (Uint8)color, end - pixel + 4);
+        else
+            fill_span32((Uint32*)pixel, (int)((end - pixel) / 4) + 1, color);
+        break;
+    }
+}
+
+/*fill count consecutive 32 bit pixels with color. fill_span32 points at
+  the fastest variant the CPU supports, picked by fill_span32_init() when
+  the module is imported*/
+static void fill_span32_c(Uint32* pixel, int count, Uint32 color)
+{
+    for(; count > 0; --count)
+        *pixel++ = color;
+}
+
+#if defined(DRAW_SSE2_SUPPORT)
+static void fill_span32_sse2(Uint32* pixel, int count, Uint32 color)
+{
+    __m128i vcolor = _mm_set1_epi32((int)color);
+    for(; count >= 4; count -= 4, pixel += 4)
+        _mm_storeu_si128((__m128i*)pixel, vcolor);
+    fill_span32_c(pixel, count, color);
+}
+#endif
+
+#if defined(DRAW_AVX2_SUPPORT)
+__attribute__((target("avx2")))
+static void fill_span32_avx2(Uint32* pixel, int count, Uint32 color)
+{
+    __m256i vcolor = _mm256_set1_epi32((int)color);
+    for(; count >= 8; count -= 8, pixel += 8)
+        _mm256_storeu_si256((__m256i*)pixel, vcolor);
+    fill_span32_c(pixel, count, color);
+}
+#endif
+
+static void fill_span32_init(void)
+{
+#if defined(DRAW_AVX2_SUPPORT)
+    __builtin_cpu_init();
+    if(__builtin_cpu_supports("avx2"))
+    {
+        fill_span32 = fill_span32_avx2;
+        return;
+    }
+#endif
+#if defined(DRAW_SSE2_SUPPORT)
+    if(SDL_HasSSE2())
+        fill_span32 = fill_span32_sse2;
+#endif
+}
+
+/*fill every (x1, x2) pair of a sorted scanline intersection list on row
+  y of a 32 bit surface, clipping each span to the clip rect*/
+static void fill_spans32(SDL_Surface* surf, Uint32 color, int y, const int* xpairs, int npoints)
+{
+    int i, x1, x2;
+    int left = surf->clip_rect.x;
+    int right = surf->clip_rect.x + surf->clip_rect.w - 1;
+    Uint32* row;
+
+    if(y < surf->clip_rect.y || y >= surf->clip_rect.y + surf->clip_rect.h)
+        return;
+    row = (Uint32*)((Uint8*)surf->pixels + surf->pitch * y);
+
+    for(i = 0; i < npoints; i += 2)
+    {
+        x1 = MAX(xpairs[i], left);
+        x2 = MIN(xpairs[i+1], right);
+        if(x1 <= x2)
+            fill_span32(row + x1, x2 - x1 + 1, color);
     }
 }
 
@@ -1186,6 +1572,36 @@ static void drawhorzlineclip(SDL_Surface* surf, Uint32 color, int x1, int y1, in
         drawhorzline(surf, color, x1, y1, x2);
 }
 
+/*draw the outline of the rect l,t to r,b the way its four width wide
+  edges would be drawn, in one pass over the rows. rows crossed by the top
+  or bottom edge get a single span, rows between them one span per side,
+  merged when the sides meet. needs r > l and b > t*/
+static void draw_rect_outline(SDL_Surface* surf, Uint32 color, int l, int t, int r, int b, int width)
+{
+    int lo = (width-1)/2, hi = width/2;
+    int y, y1, y2;
+
+    y1 = MAX(t-lo, surf->clip_rect.y);
+    y2 = MIN(b+hi, surf->clip_rect.y + surf->clip_rect.h-1);
+    for(y = y1; y <= y2; ++y)
+    {
+        if(y <= t+hi || y >= b-lo)
+        {
+            if(y >= t && y <= b)
+                drawhorzlineclip(surf, color, l-lo, y, r+hi);
+            else
+                drawhorzlineclip(surf, color, l, y, r);
+        }
+        else if(l+hi+1 >= r-lo)
+            drawhorzlineclip(surf, color, l-lo, y, r+hi);
+        else
+        {
+            drawhorzlineclip(surf, color, l-lo, y, l+hi);
+            drawhorzlineclip(surf, color, r-lo, y, r+hi);
+        }
+    }
+}
+
 static void drawvertline(SDL_Surface* surf, Uint32 color, int x1, int y1, int y2)
 {
     Uint8   *pixel, *end;
@@ -1485,21 +1901,17 @@ static int compare_int(const void *a, const void *b)
     return (*(const int *)a) - (*(const int *)b);
 }
 
-static void draw_fillpoly(SDL_Surface *dst, int *vx, int *vy, int n, Uint32 color)
+/*runs without the GIL, so it must not touch any Python objects or the
+  Python allocator. returns 0 when out of memory*/
+static int draw_fillpoly(SDL_Surface *dst, int *vx, int *vy, int n, Uint32 color)
 {
     int i;
     int y;
     int miny, maxy;
-    int x1, y1;
-    int x2, y2;
     int ind1, ind2;
-    int ints;
-    int *polyints = PyMem_New(int, n);
-    if (polyints == NULL) {
-        PyErr_NoMemory();
-        return;
-    }
-
+    int ints, numedges, numactive, next, e;
+    int ystart, yend;
+    int *polyints, *ex1, *ey1, *ex2, *ey2, *starts, *active;
 
     /* Determine Y maxima */
     miny = vy[0];
@@ -1510,60 +1922,104 @@ static void draw_fillpoly(SDL_Surface *dst, int *vx, int *vy, int n, Uint32 colo
         maxy = MAX(maxy, vy[i]);
     }
 
-    /* Draw, scanning y */
-    for(y=miny; (y <= maxy); y++) {
-        ints = 0;
-        for (i=0; (i < n); i++) {
-            if (!i) {
-                ind1 = n-1;
-                ind2 = 0;
-            } else {
-                ind1 = i-1;
-                ind2 = i;
-            }
-            y1 = vy[ind1];
-            y2 = vy[ind2];
-            if (y1 < y2) {
-                x1 = vx[ind1];
-                x2 = vx[ind2];
-            } else if (y1 > y2) {
-                y2 = vy[ind1];
-                y1 = vy[ind2];
-                x2 = vx[ind1];
-                x1 = vx[ind2];
-            } else if (miny == maxy) {
-                /* Special case: polygon only 1 pixel high. */
-                int j;
-                int minx, maxx;
-                
-                /* Determine X bounds */
-                minx = vx[0];
-                maxx = vx[0];
-                for (j=1; (j < n); j++) {
-                    minx = MIN(minx, vx[j]);
-                    maxx = MAX(maxx, vx[j]);
-                }
+    if (miny == maxy) {
+        /* Special case: polygon only 1 pixel high. */
+        int minx, maxx;
+
+        /* Determine X bounds */
+        minx = vx[0];
+        maxx = vx[0];
+        for (i=1; (i < n); i++) {
+            minx = MIN(minx, vx[i]);
+            maxx = MAX(maxx, vx[i]);
+        }
+
+        /* Just a line from minimum to maximum X */
+        drawhorzlineclip(dst, color, minx, miny, maxx);
+        return 1;
+    }
 
-                /* Just a line from minimum to maximum X */
-                polyints[ints++] = minx;
-                polyints[ints++] = maxx;
-                break;
-            } else {
+    polyints = (int*)malloc(sizeof(int) * n * 8);
+    if (polyints == NULL)
+        return 0;
+    ex1 = polyints + n;
+    ey1 = ex1 + n;
+    ex2 = ey1 + n;
+    ey2 = ex2 + n;
+    starts = ey2 + n;
+    active = starts + 2 * n;
+
+    /* Build the edge table once: every non horizontal edge, stored as
+       parallel arrays and oriented so that it runs downwards */
+    numedges = 0;
+    for (i=0; (i < n); i++) {
+        if (!i) {
+            ind1 = n-1;
+            ind2 = 0;
+        } else {
+            ind1 = i-1;
+            ind2 = i;
+        }
+        if (vy[ind1] < vy[ind2]) {
+            ey1[numedges] = vy[ind1];
+            ey2[numedges] = vy[ind2];
+            ex1[numedges] = vx[ind1];
+            ex2[numedges] = vx[ind2];
+        } else if (vy[ind1] > vy[ind2]) {
+            ey1[numedges] = vy[ind2];
+            ey2[numedges] = vy[ind1];
+            ex1[numedges] = vx[ind2];
+            ex2[numedges] = vx[ind1];
+        } else {
+            continue;
+        }
+        starts[2 * numedges] = ey1[numedges];
+        starts[2 * numedges + 1] = numedges;
+        ++numedges;
+    }
+
+    /* (top y, edge) pairs ordered by top y, so edges can join the active
+       list as the scan reaches them */
+    qsort(starts, numedges, 2 * sizeof(int), compare_int);
+
+    /* Draw, scanning y. Only rows inside the clip rect are scanned; edges
+       that started above it join the active list on the first row */
+    next = 0;
+    numactive = 0;
+    ystart = MAX(miny, dst->clip_rect.y);
+    yend = MIN(maxy, dst->clip_rect.y + dst->clip_rect.h - 1);
+    for(y=ystart; (y <= yend); y++) {
+        while ((next < numedges) && (starts[2 * next] <= y)) {
+            active[numactive++] = starts[2 * next + 1];
+            ++next;
+        }
+
+        /* Edges leave the active list once the scan passes their bottom,
+           except that the bottom row still includes edges ending on it */
+        ints = 0;
+        for (i=0; (i < numactive); ) {
+            e = active[i];
+            if ((y > ey2[e]) || ((y == ey2[e]) && (y != maxy))) {
+                active[i] = active[--numactive];
                 continue;
             }
-            if ((y >= y1) && (y < y2)) {
-                polyints[ints++] = (y-y1) * (x2-x1) / (y2-y1) + x1;
-            } else if ((y == maxy) && (y > y1) && (y <= y2)) {
-                polyints[ints++] = (y-y1) * (x2-x1) / (y2-y1) + x1;
-            }
+            polyints[ints++] = (y-ey1[e]) * (ex2[e]-ex1[e]) /
+                (ey2[e]-ey1[e]) + ex1[e];
+            ++i;
         }
         qsort(polyints, ints, sizeof(int), compare_int);
 
+        if (dst->format->BytesPerPixel == 4) {
+            /* All spans of the row in one call */
+            fill_spans32(dst, color, y, polyints, ints);
+            continue;
+        }
         for (i=0; (i<ints); i+=2) {
             drawhorzlineclip(dst, color, polyints[i], y, polyints[i+1]);
         }
     }
-    PyMem_Free(polyints);
+    free(polyints);
+    return 1;
 }
 
 
@@ -1574,6 +2030,7 @@ static PyMethodDef _draw_methods[] =
     { "line", line, METH_VARARGS, DOC_PYGAMEDRAWLINE },
     { "aalines", aalines, METH_VARARGS, DOC_PYGAMEDRAWAALINES },
     { "lines", lines, METH_VARARGS, DOC_PYGAMEDRAWLINES },
+    { "lines_batch", lines_batch, METH_VARARGS, DOC_PYGAMEDRAWLINESBATCH },
     { "ellipse", ellipse, METH_VARARGS, DOC_PYGAMEDRAWELLIPSE },
     { "arc", arc, METH_VARARGS, DOC_PYGAMEDRAWARC },
     { "circle", circle, METH_VARARGS, DOC_PYGAMEDRAWCIRCLE },
@@ -1617,6 +2074,8 @@ MODINIT_DEFINE (draw)
         MODINIT_ERROR;
     }
 
+    fill_span32_init();
+
     /* create the module */
 #if PY3
     return PyModule_Create (&_module);
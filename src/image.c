@@ -48,6 +48,19 @@ static SDL_Surface* opengltosdl (void);
     ((flipped) ? (((char*) data) + (height - row - 1) * width) : \
      (((char*) data) + row * width))
 
+/* mask of the i'th byte of a 32 bit pixel, counted in memory order */
+#if SDL_BYTEORDER == SDL_LIL_ENDIAN
+#define BYTEMASK(i) (0xFFU << ((i) * 8))
+#else
+#define BYTEMASK(i) (0xFFU << ((3 - (i)) * 8))
+#endif
+
+/* true when a 32 bit pixel already stores its channels in the byte order
+ * the string format asks for, so whole rows can be copied unchanged */
+#define SAMEBYTEORDER(format, r, g, b, a)                                 \
+    ((format)->Rmask == BYTEMASK(r) && (format)->Gmask == BYTEMASK(g) && \
+     (format)->Bmask == BYTEMASK(b) && (format)->Amask == BYTEMASK(a))
+
 static PyObject*
 image_load_basic(PyObject *self, PyObject *arg)
 {
@@ -302,11 +315,123 @@ image_get_extended (PyObject* self, PyObject* arg)
     return PyInt_FromLong (GETSTATE (self)->is_extended);
 }
 
+/* copy rows of rowbytes each from src to dst, walking dst backwards when
+ * flipped. Unpadded, unflipped rows go over in a single memcpy */
+static void
+copy_rows (char *dst, int dstpitch, const char *src, int srcpitch,
+           int rowbytes, int rows, int flipped)
+{
+    int row;
+
+    if (!flipped && dstpitch == rowbytes && srcpitch == rowbytes)
+    {
+        memcpy (dst, src, (size_t) rowbytes * rows);
+        return;
+    }
+    if (flipped)
+    {
+        dst += (rows - 1) * dstpitch;
+        dstpitch = -dstpitch;
+    }
+    for (row = 0; row < rows; ++row, dst += dstpitch, src += srcpitch)
+        memcpy (dst, src, rowbytes);
+}
+
+/* expand an 8 bit palette into a table of 4 byte RGBA entries, so each
+ * indexed pixel becomes a single lookup */
+static void
+palette_to_rgba (SDL_PixelFormat *format, int hascolorkey, int colorkey,
+                 Uint8 *table)
+{
+    SDL_Color *colors = format->palette->colors;
+    int ncolors = MIN (format->palette->ncolors, 256);
+    int i;
+
+    memset (table, 0, 256 * 4);
+    for (i = 0; i < ncolors; ++i)
+    {
+        table[0] = colors[i].r;
+        table[1] = colors[i].g;
+        table[2] = colors[i].b;
+        table[3] = hascolorkey ? (Uint8)(i != colorkey) * 255 : 255;
+        table += 4;
+    }
+}
+
+/* find where each channel named in order ("RGB", "RGBA", ...) sits within a
+ * 24 or 32 bit pixel; fails unless every channel fills one whole byte. A
+ * missing alpha channel reads any byte and is forced opaque through fill */
+static int
+channel_offsets (SDL_PixelFormat *format, const char *order, int *offset,
+                 Uint8 *fill)
+{
+    int bytes = format->BytesPerPixel;
+    Uint32 mask;
+    int i;
+
+    for (; *order; ++order, ++offset, ++fill)
+    {
+        switch (*order)
+        {
+        case 'R': mask = format->Rmask; break;
+        case 'G': mask = format->Gmask; break;
+        case 'B': mask = format->Bmask; break;
+        default: mask = format->Amask; break;
+        }
+        *offset = 0;
+        *fill = 0;
+        if (!mask)
+        {
+            if (*order != 'A')
+                return 0;
+            *fill = 0xFF;
+            continue;
+        }
+        for (i = 0; i < bytes; ++i)
+        {
+#if SDL_BYTEORDER == SDL_LIL_ENDIAN
+            if (mask == 0xFFU << (i * 8))
+#else
+            if (mask == 0xFFU << ((bytes - 1 - i) * 8))
+#endif
+                break;
+        }
+        if (i == bytes)
+            return 0;
+        *offset = i;
+    }
+    return 1;
+}
+
+/* copy channel bytes straight out of each pixel, no mask or shift needed */
+static void
+gather_channels (SDL_Surface *surf, int flipped, char *data,
+                 const int *offset, const Uint8 *fill, int channels)
+{
+    int bytes = surf->format->BytesPerPixel;
+    int pitch = flipped ? -surf->pitch : surf->pitch;
+    Uint8 *row = (Uint8*) DATAROW (surf->pixels, 0, surf->pitch, surf->h,
+                                   flipped);
+    int w, h, i;
+
+    for (h = 0; h < surf->h; ++h, row += pitch)
+    {
+        Uint8* ptr = row;
+        for (w = 0; w < surf->w; ++w)
+        {
+            for (i = 0; i < channels; ++i)
+                data[i] = (char) (ptr[offset[i]] | fill[i]);
+            ptr += bytes;
+            data += channels;
+        }
+    }
+}
+
 PyObject*
 image_tostring (PyObject* self, PyObject* arg)
 {
     PyObject *surfobj, *string = NULL;
-    char *format, *data, *pixels;
+    char *format, *data;
     SDL_Surface *surf, *temp = NULL;
     int w, h, color, flipped = 0;
     Py_ssize_t len;
@@ -314,6 +439,9 @@ image_tostring (PyObject* self, PyObject* arg)
         Gloss, Bloss, Aloss;
     int hascolorkey, colorkey;
     Uint32 alpha;
+    Uint8 palette[256 * 4], *entry;
+    int offset[4];
+    Uint8 fill[4];
 
     if (!PyArg_ParseTuple (arg, "O!s|i", &PySurface_Type, &surfobj, &format,
                            &flipped))
@@ -353,10 +481,8 @@ image_tostring (PyObject* self, PyObject* arg)
         Bytes_AsStringAndSize (string, &data, &len);
 
         PySurface_Lock (surfobj);
-        pixels = (char*) surf->pixels;
-        for (h = 0; h < surf->h; ++h)
-            memcpy (DATAROW (data, h, surf->w, surf->h, flipped),
-                    pixels + (h * surf->pitch), surf->w);
+        copy_rows (data, surf->w, (char*) surf->pixels, surf->pitch, surf->w,
+                   surf->h, flipped);
         PySurface_Unlock (surfobj);
     }
     else if (!strcmp (format, "RGB"))
@@ -368,20 +494,20 @@ image_tostring (PyObject* self, PyObject* arg)
 
         if (!temp)
             PySurface_Lock (surfobj);
-        pixels = (char*) surf->pixels;
         switch (surf->format->BytesPerPixel)
         {
         case 1:
+            palette_to_rgba (surf->format, 0, 0, palette);
             for (h = 0; h < surf->h; ++h)
             {
                 Uint8* ptr = (Uint8*) DATAROW (surf->pixels, h, surf->pitch,
                                                surf->h, flipped);
                 for (w = 0; w < surf->w; ++w)
                 {
-                    color = *ptr++;
-                    data[0] = (char) surf->format->palette->colors[color].r;
-                    data[1] = (char) surf->format->palette->colors[color].g;
-                    data[2] = (char) surf->format->palette->colors[color].b;
+                    entry = palette + (*ptr++ << 2);
+                    data[0] = (char) entry[0];
+                    data[1] = (char) entry[1];
+                    data[2] = (char) entry[2];
                     data += 3;
                 }
             }
@@ -402,6 +528,11 @@ image_tostring (PyObject* self, PyObject* arg)
             }
             break;
         case 3:
+            if (channel_offsets (surf->format, "RGB", offset, fill))
+            {
+                gather_channels (surf, flipped, data, offset, fill, 3);
+                break;
+            }
             for (h = 0; h < surf->h; ++h)
             {
                 Uint8* ptr = (Uint8*) DATAROW (surf->pixels, h, surf->pitch,
@@ -422,6 +553,11 @@ image_tostring (PyObject* self, PyObject* arg)
             }
             break;
         case 4:
+            if (channel_offsets (surf->format, "RGB", offset, fill))
+            {
+                gather_channels (surf, flipped, data, offset, fill, 3);
+                break;
+            }
             for (h = 0; h < surf->h; ++h)
             {
                 Uint32* ptr = (Uint32*) DATAROW (surf->pixels, h, surf->pitch,
@@ -430,8 +566,8 @@ image_tostring (PyObject* self, PyObject* arg)
                 {
                     color = *ptr++;
                     data[0] = (char) (((color & Rmask) >> Rshift) << Rloss);
-                    data[1] = (char) (((color & Gmask) >> Gshift) << Rloss);
-                    data[2] = (char) (((color & Bmask) >> Bshift) << Rloss);
+                    data[1] = (char) (((color & Gmask) >> Gshift) << Gloss);
+                    data[2] = (char) (((color & Bmask) >> Bshift) << Bloss);
                     data += 3;
                 }
             }
@@ -451,22 +587,17 @@ image_tostring (PyObject* self, PyObject* arg)
         Bytes_AsStringAndSize (string, &data, &len);
 
         PySurface_Lock (surfobj);
-        pixels = (char*) surf->pixels;
         switch (surf->format->BytesPerPixel)
         {
         case 1:
+            palette_to_rgba (surf->format, hascolorkey, colorkey, palette);
             for(h = 0; h < surf->h; ++h)
             {
                 Uint8* ptr = (Uint8*) DATAROW (surf->pixels, h, surf->pitch,
                                                surf->h, flipped);
                 for(w = 0; w < surf->w; ++w)
                 {
-                    color = *ptr++;
-                    data[0] = (char) surf->format->palette->colors[color].r;
-                    data[1] = (char) surf->format->palette->colors[color].g;
-                    data[2] = (char) surf->format->palette->colors[color].b;
-                    data[3] = hascolorkey ? (char)(color != colorkey) * 255 :
-                        (char)255;
+                    memcpy (data, palette + (*ptr++ << 2), 4);
                     data += 4;
                 }
             }
@@ -490,6 +621,12 @@ image_tostring (PyObject* self, PyObject* arg)
             }
             break;
         case 3:
+            if (!hascolorkey &&
+                channel_offsets (surf->format, "RGBA", offset, fill))
+            {
+                gather_channels (surf, flipped, data, offset, fill, 4);
+                break;
+            }
             for (h = 0; h < surf->h; ++h)
             {
                 Uint8* ptr = (Uint8*) DATAROW (surf->pixels, h, surf->pitch,
@@ -513,6 +650,18 @@ image_tostring (PyObject* self, PyObject* arg)
             }
             break;
         case 4:
+            if (SAMEBYTEORDER (surf->format, 0, 1, 2, 3))
+            {
+                copy_rows (data, surf->w * 4, (char*) surf->pixels,
+                           surf->pitch, surf->w * 4, surf->h, flipped);
+                break;
+            }
+            if (!hascolorkey &&
+                channel_offsets (surf->format, "RGBA", offset, fill))
+            {
+                gather_channels (surf, flipped, data, offset, fill, 4);
+                break;
+            }
             for (h = 0; h < surf->h; ++h)
             {
                 Uint32* ptr = (Uint32*) DATAROW (surf->pixels, h, surf->pitch,
@@ -543,22 +692,21 @@ image_tostring (PyObject* self, PyObject* arg)
         Bytes_AsStringAndSize (string, &data, &len);
 
         PySurface_Lock (surfobj);
-        pixels = (char*) surf->pixels;
         switch (surf->format->BytesPerPixel)
         {
         case 1:
+            palette_to_rgba (surf->format, hascolorkey, colorkey, palette);
             for (h = 0; h < surf->h; ++h)
             {
                 Uint8* ptr = (Uint8*) DATAROW (surf->pixels, h, surf->pitch,
                                                surf->h, flipped);
                 for (w = 0; w < surf->w; ++w)
                 {
-                    color = *ptr++;
-                    data[1] = (char)surf->format->palette->colors[color].r;
-                    data[2] = (char)surf->format->palette->colors[color].g;
-                    data[3] = (char)surf->format->palette->colors[color].b;
-                    data[0] = hascolorkey ? (char)(color!=colorkey)*255 :
-                        (char)255;
+                    entry = palette + (*ptr++ << 2);
+                    data[0] = (char) entry[3];
+                    data[1] = (char) entry[0];
+                    data[2] = (char) entry[1];
+                    data[3] = (char) entry[2];
                     data += 4;
                 }
             }
@@ -582,6 +730,11 @@ image_tostring (PyObject* self, PyObject* arg)
             }
             break;
         case 3:
+            if (channel_offsets (surf->format, "ARGB", offset, fill))
+            {
+                gather_channels (surf, flipped, data, offset, fill, 4);
+                break;
+            }
             for (h = 0; h < surf->h; ++h)
             {
                 Uint8* ptr = (Uint8*) DATAROW (surf->pixels, h, surf->pitch,
@@ -605,6 +758,17 @@ image_tostring (PyObject* self, PyObject* arg)
             }
             break;
         case 4:
+            if (SAMEBYTEORDER (surf->format, 1, 2, 3, 0))
+            {
+                copy_rows (data, surf->w * 4, (char*) surf->pixels,
+                           surf->pitch, surf->w * 4, surf->h, flipped);
+                break;
+            }
+            if (channel_offsets (surf->format, "ARGB", offset, fill))
+            {
+                gather_channels (surf, flipped, data, offset, fill, 4);
+                break;
+            }
             for (h = 0; h < surf->h; ++h)
             {
                 Uint32* ptr = (Uint32*) DATAROW (surf->pixels, h, surf->pitch,
@@ -640,7 +804,6 @@ image_tostring (PyObject* self, PyObject* arg)
         Bytes_AsStringAndSize (string, &data, &len);
 
         PySurface_Lock (surfobj);
-        pixels = (char*) surf->pixels;
         switch (surf->format->BytesPerPixel)
         {
         case 2:
@@ -724,7 +887,6 @@ image_tostring (PyObject* self, PyObject* arg)
         Bytes_AsStringAndSize (string, &data, &len);
 
         PySurface_Lock (surfobj);
-        pixels = (char*) surf->pixels;
         switch (surf->format->BytesPerPixel)
         {
         case 2:
@@ -808,7 +970,7 @@ image_tostring (PyObject* self, PyObject* arg)
 PyObject*
 image_fromstring (PyObject* self, PyObject* arg)
 {
-    PyObject *string;
+    PyObject *string, *result;
     char *format, *data;
     SDL_Surface *surf = NULL;
     int w, h, flipped=0;
@@ -835,9 +997,7 @@ image_fromstring (PyObject* self, PyObject* arg)
         if (!surf)
             return RAISE (PyExc_SDLError, SDL_GetError ());
         SDL_LockSurface (surf);
-        for (looph = 0; looph < h; ++looph)
-            memcpy(((char*) surf->pixels) + looph * surf->pitch,
-                   DATAROW (data, looph, w, h, flipped), w);
+        copy_rows ((char*) surf->pixels, surf->pitch, data, w, w, h, flipped);
         SDL_UnlockSurface (surf);
     }
     else if (!strcmp (format, "RGB"))
@@ -889,16 +1049,8 @@ image_fromstring (PyObject* self, PyObject* arg)
         if (!surf)
             return RAISE (PyExc_SDLError, SDL_GetError ());
         SDL_LockSurface (surf);
-        for (looph = 0; looph < h; ++looph)
-        {
-            Uint32* pix = (Uint32*) DATAROW (surf->pixels, looph, surf->pitch,
-                                             h, flipped);
-            for (loopw = 0; loopw < w; ++loopw)
-            {
-                *pix++ = *((Uint32*) data);
-                data += 4;
-            }
-        }
+        copy_rows ((char*) surf->pixels, surf->pitch, data, w * 4, w * 4, h,
+                   flipped);
         SDL_UnlockSurface (surf);
     }
     else if (!strcmp (format, "ARGB"))
@@ -916,16 +1068,8 @@ image_fromstring (PyObject* self, PyObject* arg)
         if (!surf)
             return RAISE (PyExc_SDLError, SDL_GetError ());
         SDL_LockSurface (surf);
-        for (looph = 0; looph < h; ++looph)
-        {
-            Uint32* pix = (Uint32*) DATAROW (surf->pixels, looph, surf->pitch,
-                                             h, flipped);
-            for (loopw = 0; loopw < w; ++loopw)
-            {
-                *pix++ = *((Uint32*) data);
-                data += 4;
-            }
-        }
+        copy_rows ((char*) surf->pixels, surf->pitch, data, w * 4, w * 4, h,
+                   flipped);
         SDL_UnlockSurface (surf);
     }
     else
@@ -933,7 +1077,10 @@ image_fromstring (PyObject* self, PyObject* arg)
 
     if (!surf)
         return NULL;
-    return PySurface_New (surf);
+    result = PySurface_New (surf);
+    if (!result)
+        SDL_FreeSurface (surf);
+    return result;
 }
 
 PyObject*
@@ -1000,7 +1147,7 @@ image_frombuffer (PyObject* self, PyObject* arg)
                                          0xFF<<24, 0xFF<<16, 0xFF<<8,
                                          (alphamult ? 0xFF : 0));
 #endif
-        if(alphamult)
+        if (surf && alphamult)
             surf->flags |= SDL_SRCALPHA;
     }
     else if (!strcmp (format, "ARGB"))
@@ -1015,7 +1162,8 @@ image_frombuffer (PyObject* self, PyObject* arg)
 #else
                                          0xFF, 0xFF<<24, 0xFF<<16, 0xFF<<8);
 #endif
-        surf->flags |= SDL_SRCALPHA;
+        if (surf)
+            surf->flags |= SDL_SRCALPHA;
     }
     else
         return RAISE(PyExc_ValueError, "Unrecognized type of format");
@@ -1023,6 +1171,11 @@ image_frombuffer (PyObject* self, PyObject* arg)
     if (!surf)
         return RAISE (PyExc_SDLError, SDL_GetError ());
     surfobj = PySurface_New (surf);
+    if (!surfobj)
+    {
+        SDL_FreeSurface (surf);
+        return NULL;
+    }
     Py_INCREF (buffer);
     ((PySurfaceObject*) surfobj)->dependency = buffer;
     return surfobj;
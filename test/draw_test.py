@@ -91,6 +91,43 @@ class DrawModuleTest(unittest.TestCase):
             color_at_pt = self.surf.get_at(pt)
             self.assert_(color_at_pt != self.color)
 
+    def test_rect__wide_outline(self):
+        # Wide outlines must match drawing the four edges as lines, and
+        # return the same Rect as the closed point list given to lines().
+        cases = [
+            # (rect, width, clip, expected return)
+            ((20, 20, 30, 15), 4, None, (20, 19, 32, 18)),
+            ((20, 20, 30, 15), 5, None, (20, 18, 32, 19)),
+            # sides wide enough to meet in the middle
+            ((40, 40, 6, 20), 9, None, (40, 36, 10, 28)),
+            # partly outside the clip rect
+            ((10, 10, 30, 30), 3, (25, 25, 20, 20), (10, 10, 31, 31)),
+            ((300, 180, 40, 40), 6, None, (300, 178, 20, 6)),
+        ]
+        for rect, width, clip, expected in cases:
+            msg = "%s, width %s, clip %s" % (rect, width, clip)
+            surf = pygame.Surface(self.surf_size, pygame.SRCALPHA)
+            lines_surf = pygame.Surface(self.surf_size, pygame.SRCALPHA)
+            if clip is not None:
+                surf.set_clip(clip)
+                lines_surf.set_clip(clip)
+
+            drawn = draw.rect(surf, self.color, rect, width)
+            self.assertEqual(drawn, expected, msg)
+
+            l, t, w, h = rect
+            r, b = l + w - 1, t + h - 1
+            corners = [(l, t), (r, t), (r, b), (l, b)]
+            for i in range(4):
+                draw.line(lines_surf, self.color, corners[i],
+                          corners[(i + 1) % 4], width)
+            self.assertEqual(pygame.image.tostring(surf, "RGBA"),
+                             pygame.image.tostring(lines_surf, "RGBA"), msg)
+
+            lines_surf.fill((0, 0, 0, 0))
+            self.assertEqual(draw.lines(lines_surf, self.color, True,
+                                        corners, width), drawn, msg)
+
     def test_line(self):
 
         # __doc__ (as of 2008-06-25) for pygame.draw.line:
@@ -163,6 +200,57 @@ class DrawModuleTest(unittest.TestCase):
             msg += ", %s" % (rec,)
             self.assert_(rec == (rx, ry, w, h), msg)
         
+    def test_line__24bit(self):
+        # Single point and diagonal lines on a 24 bit surface go through
+        # the per-pixel byte stores.
+        for masks in [(0xff0000, 0xff00, 0xff, 0), (0xff, 0xff00, 0xff0000, 0)]:
+            surf = pygame.Surface((10, 10), 0, 24, masks)
+            surf.fill((0, 0, 0))
+            color = (10, 20, 30)
+            draw.line(surf, color, (3, 4), (3, 4))
+            self.assertEqual(surf.get_at((3, 4)), color)
+            draw.line(surf, color, (0, 0), (9, 9))
+            for i in range(10):
+                self.assertEqual(surf.get_at((i, i)), color)
+            self.assertEqual(surf.get_at((1, 0)), (0, 0, 0))
+
+    def test_line__horizontal_spans(self):
+        # Horizontal spans on 16, 24 and 32 bit surfaces, for colors made of
+        # one repeated byte and colors that are not.
+        formats = [(16, (0xf800, 0x07e0, 0x001f, 0)),
+                   (16, (0x001f, 0x07e0, 0xf800, 0)),
+                   (24, (0xff0000, 0xff00, 0xff, 0)),
+                   (24, (0xff, 0xff00, 0xff0000, 0)),
+                   (32, (0xff0000, 0xff00, 0xff, 0))]
+        colors = [(255, 255, 255), (0, 0, 0), (10, 20, 30), (200, 100, 50)]
+        spans = [(3, 40), (7, 8), (0, 49)]
+        for depth, masks in formats:
+            surf = pygame.Surface((50, 6), 0, depth, masks)
+            for color in colors:
+                mapped = surf.map_rgb(color)
+                background = surf.map_rgb((90, 60, 30))
+                if background == mapped:
+                    background = surf.map_rgb((30, 60, 90))
+                for x1, x2 in spans:
+                    msg = "depth %s, masks %s, color %s, span %s" % (
+                        depth, masks, color, (x1, x2))
+                    surf.fill(background)
+                    draw.line(surf, color, (x2, 2), (x1, 2))
+                    draw.rect(surf, color, (x1, 4, x2 - x1 + 1, 1))
+                    for y in (2, 4):
+                        self.assertEqual(surf.get_at_mapped((x1, y)), mapped, msg)
+                        self.assertEqual(surf.get_at_mapped((x2, y)), mapped, msg)
+                        self.assertEqual(surf.get_at_mapped(((x1 + x2) // 2, y)),
+                                         mapped, msg)
+                        if x1 > 0:
+                            self.assertEqual(surf.get_at_mapped((x1 - 1, y)),
+                                             background, msg)
+                        if x2 < 49:
+                            self.assertEqual(surf.get_at_mapped((x2 + 1, y)),
+                                             background, msg)
+                        self.assertEqual(surf.get_at_mapped((x1, y + 1)),
+                                         background, msg)
+
     def todo_test_aaline(self):
 
         # __doc__ (as of 2008-08-02) for pygame.draw.aaline:
@@ -260,7 +348,59 @@ class DrawModuleTest(unittest.TestCase):
 
         self.fail() 
 
-    def todo_test_polygon(self):
+    def test_lines_batch(self):
+
+          # pygame.draw.lines_batch(Surface, color, segments, width=1): return Rect
+          # draw many separate line segments
+
+        segments = [((1, 1), (10, 1)), ((20, 5), (20, 15)), ((30, 30), (40, 40))]
+        drawn = draw.lines_batch(self.surf, self.color, segments)
+        self.assertEqual(drawn, (1, 1, 40, 40))
+
+        expected = pygame.Surface(self.surf_size, pygame.SRCALPHA)
+        for start, end in segments:
+            draw.line(expected, self.color, start, end)
+        for pt in [(1, 1), (10, 1), (20, 5), (20, 15), (35, 35), (40, 40)]:
+            self.assertEqual(self.surf.get_at(pt), self.color)
+        self.assertEqual(pygame.image.tostring(self.surf, "RGBA"),
+                         pygame.image.tostring(expected, "RGBA"))
+
+        # Wide diagonal segments: the Rect covers every offset copy
+        surf = pygame.Surface(self.surf_size, pygame.SRCALPHA)
+        drawn = draw.lines_batch(surf, self.color, [((10, 10), (5, 30))], 4)
+        self.assertEqual(drawn, (4, 10, 9, 21))
+        self.assertEqual(drawn, surf.get_bounding_rect())
+
+        # Wide, clipped segments match drawing them one at a time, and the
+        # Rect bounds exactly the pixels that were set
+        segments = [((2, 0), (20, 16)), ((44, 40), (30, 22)),
+                    ((100, 100), (120, 90))]
+        for width, right in ((2, 43), (5, 44), (8, 45)):
+            surf = pygame.Surface(self.surf_size, pygame.SRCALPHA)
+            expected = pygame.Surface(self.surf_size, pygame.SRCALPHA)
+            surf.set_clip((8, 6, 40, 30))
+            expected.set_clip((8, 6, 40, 30))
+            drawn = draw.lines_batch(surf, self.color, segments, width)
+            for start, end in segments:
+                draw.line(expected, self.color, start, end, width)
+            self.assertEqual(pygame.image.tostring(surf, "RGBA"),
+                             pygame.image.tostring(expected, "RGBA"), width)
+            self.assertEqual(drawn, expected.get_bounding_rect(), width)
+            self.assertEqual(drawn, (8, 6, right - 8, 30), width)
+
+        # Segments outside the surface draw nothing
+        drawn = draw.lines_batch(self.surf, self.color, [((-5, -5), (-1, -9))])
+        self.assertEqual(drawn.size, (0, 0))
+        self.assertEqual(draw.lines_batch(self.surf, self.color, []),
+                         (0, 0, 0, 0))
+
+        # A bad segment is rejected before anything is drawn
+        self.surf.fill((0, 0, 0, 0))
+        self.assertRaises(TypeError, draw.lines_batch, self.surf, self.color,
+                          [((1, 1), (5, 5)), ((1, 2),)])
+        self.assertEqual(self.surf.get_at((1, 1)), (0, 0, 0, 0))
+
+    def test_polygon(self):
 
         # __doc__ (as of 2008-08-02) for pygame.draw.polygon:
 
@@ -274,7 +414,37 @@ class DrawModuleTest(unittest.TestCase):
           # 
           # For aapolygon, use aalines with the 'closed' parameter. 
 
-        self.fail() 
+        # A filled square covers its corners inclusively
+        rect = pygame.Rect(10, 10, 21, 11)
+        points = [rect.topleft, (rect.right - 1, rect.top),
+                  (rect.right - 1, rect.bottom - 1), (rect.left, rect.bottom - 1)]
+        drawn = draw.polygon(self.surf, self.color, points)
+        self.assertEqual(drawn, rect)
+        for pt in test_utils.rect_area_pts(rect):
+            self.assertEqual(self.surf.get_at(pt), self.color)
+        for pt in test_utils.rect_outer_bounds(rect):
+            self.assertNotEqual(self.surf.get_at(pt), self.color)
+
+        # A concave "U" shape leaves its notch unfilled
+        self.surf.fill((0, 0, 0))
+        points = [(50, 50), (60, 50), (60, 70), (70, 70),
+                  (70, 50), (80, 50), (80, 80), (50, 80)]
+        draw.polygon(self.surf, self.color, points)
+        self.assertEqual(self.surf.get_at((55, 60)), self.color)
+        self.assertEqual(self.surf.get_at((75, 60)), self.color)
+        self.assertEqual(self.surf.get_at((65, 75)), self.color)
+        self.assertEqual(self.surf.get_at((65, 60)), (0, 0, 0))
+        self.assertEqual(self.surf.get_at((65, 85)), (0, 0, 0))
+
+        # Shapes partly outside the surface are clipped
+        self.surf.fill((0, 0, 0))
+        points = [(-20, -20), (self.surf_w + 20, -20),
+                  (self.surf_w + 20, 10), (-20, 10)]
+        draw.polygon(self.surf, self.color, points)
+        for x in range(self.surf_w):
+            self.assertEqual(self.surf.get_at((x, 0)), self.color)
+            self.assertEqual(self.surf.get_at((x, 10)), self.color)
+            self.assertEqual(self.surf.get_at((x, 11)), (0, 0, 0))
 
 ################################################################################
 
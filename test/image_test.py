@@ -16,7 +16,7 @@ if is_pygame_pkg:
 else:
     from test.test_utils import example_path, png
 import pygame, pygame.image, pygame.pkgdata
-from pygame.compat import xrange_, ord_
+from pygame.compat import xrange_, ord_, as_bytes
 
 import os
 import array
@@ -328,7 +328,55 @@ class ImageModuleTest( unittest.TestCase ):
         
         no_alpha_surface = pygame.Surface((256, 256), 0, 24)
         self.assertRaises(ValueError, pygame.image.tostring, no_alpha_surface, "RGBA_PREMULT")
-        
+
+    def test_to_string__rgb_32bit_channel_loss(self):
+        """ test each channel of a 32 bit surface is expanded by its own loss
+        """
+        test_surface = pygame.Surface((4, 2), 0, 32,
+                                      (0xF800, 0x07E0, 0x001F, 0))
+        colors = [(248, 252, 248), (8, 4, 8), (128, 64, 32), (40, 188, 200)]
+        for x, color in enumerate(colors):
+            test_surface.set_at((x, 0), color)
+            test_surface.set_at((x, 1), color)
+
+        # tostring only shifts each channel up by its loss, so the expected
+        # bytes come from the raw pixel bits rather than from get_at, which
+        # also fills in the low bits.
+        masks = test_surface.get_masks()[:3]
+        shifts = test_surface.get_shifts()[:3]
+        losses = test_surface.get_losses()[:3]
+        rgb_buf = pygame.image.tostring(test_surface, "RGB")
+        expected = array.array("B")
+        for y in xrange_(2):
+            for x in xrange_(4):
+                pixel = test_surface.get_at_mapped((x, y))
+                for mask, shift, loss in zip(masks, shifts, losses):
+                    expected.append(((pixel & mask) >> shift) << loss)
+        self.assertEqual(rgb_buf, expected.tostring())
+        self.assertEqual(rgb_buf[:6], as_bytes('\xf8\xfc\xf8\x08\x04\x08'))
+
+
+    def test_to_string__flipped(self):
+        """ test flipped strings hold every row, bottom row first
+        """
+        for fmt, depth in [("P", 8), ("RGBA", 32), ("ARGB", 32)]:
+            if depth == 8:
+                test_surface = pygame.Surface((3, 3), 0, 8)
+                test_surface.set_palette([(i, 0, 0) for i in xrange_(256)])
+            else:
+                test_surface = pygame.Surface((3, 3), pygame.SRCALPHA, 32)
+            for y in xrange_(3):
+                for x in xrange_(3):
+                    test_surface.set_at((x, y), (y * 3 + x, 0, 0, 255))
+
+            flat = pygame.image.tostring(test_surface, fmt)
+            flipped = pygame.image.tostring(test_surface, fmt, True)
+            row = len(flat) // 3
+            self.assertEqual(flipped, flat[2 * row:] + flat[row:2 * row] +
+                                      flat[:row], fmt)
+            restored = pygame.image.fromstring(flipped, (3, 3), fmt, True)
+            self.assertEqual(pygame.image.tostring(restored, fmt), flat, fmt)
+
 
     def test_fromstring__and_tostring(self):
         """ see if fromstring, and tostring methods are symmetric.
@@ -407,7 +455,7 @@ class ImageModuleTest( unittest.TestCase ):
         self.assert_(AreSurfacesIdentical(test_surface, test_to_from_argb_string))
         #"ERROR: image.fromstring and image.tostring with ARGB are not symmetric"
 
-    def todo_test_frombuffer(self):
+    def test_frombuffer(self):
 
         # __doc__ (as of 2008-08-02) for pygame.image.frombuffer:
 
@@ -422,7 +470,23 @@ class ImageModuleTest( unittest.TestCase ):
           # This will run much faster than pygame.image.fromstring, since no
           # pixel data must be allocated and copied.
 
-        self.fail() 
+        rgba = as_bytes('\x01\x02\x03\x04\x05\x06\x07\x08'
+                        '\x09\x0a\x0b\x0c\x0d\x0e\x0f\x10')
+        surf = pygame.image.frombuffer(rgba, (2, 2), "RGBA")
+        self.assertEqual(surf.get_size(), (2, 2))
+        self.assertEqual(surf.get_at((0, 0)), (1, 2, 3, 4))
+        self.assertEqual(surf.get_at((1, 0)), (5, 6, 7, 8))
+        self.assertEqual(surf.get_at((0, 1)), (9, 10, 11, 12))
+        self.assertEqual(surf.get_at((1, 1)), (13, 14, 15, 16))
+        self.assertEqual(pygame.image.tostring(surf, "RGBA"), rgba)
+
+        rgb = as_bytes('\x01\x02\x03\x04\x05\x06')
+        surf = pygame.image.frombuffer(rgb, (2, 1), "RGB")
+        self.assertEqual(surf.get_at((0, 0)), (1, 2, 3, 255))
+        self.assertEqual(surf.get_at((1, 0)), (4, 5, 6, 255))
+
+        self.assertRaises(ValueError, pygame.image.frombuffer,
+                          rgba, (3, 2), "RGBA")
 
     def todo_test_get_extended(self):
 